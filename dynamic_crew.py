@@ -1,93 +1,348 @@
-from crewai import Agent, Task, Crew, Process
+from crewai import Agent, Task, Crew, Process, LLM
 from crewai_tools import WebsiteSearchTool, FileReadTool
 from crewai.tools import tool
-from exa_py import Exa
+from crewai.crews.crew_output import CrewOutput
+from crewai.types.usage_metrics import UsageMetrics
 import os
 import re
+import asyncio
 import json
-from typing import List, Dict, Any, Optional
+import orjson
+import copy
+import time
+import hashlib
+import threading
+import functools
+import concurrent.futures
+import logging
+import httpx
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from langchain_openai import ChatOpenAI
 
-# Create custom Exa search tool
-@tool("Exa search and get contents")
-def exa_search_tool(query: str) -> str:
-    """Tool using Exa's Python SDK to run semantic search and return result highlights."""
+log = logging.getLogger(__name__)
+
+# {variable} placeholders and the outermost JSON object in an LLM response
+_PLACEHOLDER_RE = re.compile(r'\{[^}]*\}')
+_JSON_BLOB_RE = re.compile(r'\{[\s\S]*\}')
+_JSON_ARRAY_RE = re.compile(r'\[[\s\S]*\]')
+_AGENTS_KEY_RE = re.compile(r'"agents"\s*:\s*(?=\[)')
+_JSON_DECODER = json.JSONDecoder()
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # semantic matching is optional, fall back to exact matches
+    SentenceTransformer = None
+
+class SemanticCache:
+    """LRU cache that also matches paraphrased queries by embedding similarity."""
+    
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2",
+                 threshold=0.95, max_entries=512):
+        self.model_name = model_name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._encoder = None
+        self._entries = OrderedDict()  # normalized query -> (embedding, response)
+        self._lock = threading.Lock()
+    
+    def _embed(self, text: str):
+        if SentenceTransformer is None:
+            return None
+        with self._lock:
+            if self._encoder is None:
+                self._encoder = SentenceTransformer(self.model_name)
+        return self._encoder.encode(text, normalize_embeddings=True)
+    
+    @staticmethod
+    def _normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+    
+    def lookup(self, query: str) -> Tuple[Optional[str], Any]:
+        """Return (cached response or None, query embedding if one had to be computed).
+        
+        Pass the embedding on to set() after a miss so the query is only encoded once.
+        """
+        key = self._normalize(query)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][1], None
+            if not self._entries:
+                return None, None
+        
+        vector = self._embed(key)
+        if vector is None:
+            return None, None
+        
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for cached_key, (cached_vector, _) in self._entries.items():
+                # Embeddings are normalized, so the dot product is the cosine similarity
+                score = float(vector @ cached_vector)
+                if score >= best_score:
+                    best_key, best_score = cached_key, score
+            if best_key is None:
+                return None, vector
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1], vector
+    
+    def get(self, query: str) -> Optional[str]:
+        return self.lookup(query)[0]
+    
+    def set(self, query: str, response: str, vector=None):
+        key = self._normalize(query)
+        if vector is None:
+            vector = self._embed(key)
+        with self._lock:
+            self._entries[key] = (vector, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+# Shared across agents so related searches within a crew hit the same cache
+exa_search_cache = SemanticCache()
+
+EXA_SEARCH_URL = "https://api.exa.ai/search"
+
+# Crews in different worker threads can make their first search at the same moment,
+# so the loop and client are created under a lock to guarantee exactly one of each
+_io_lock = threading.Lock()
+_IO_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+def _io_loop() -> asyncio.AbstractEventLoop:
+    """Event loop on a daemon thread that owns the shared HTTP client."""
+    global _IO_LOOP
+    with _io_lock:
+        if _IO_LOOP is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="crew-io", daemon=True).start()
+            _IO_LOOP = loop
+        return _IO_LOOP
+
+def _http_client() -> httpx.AsyncClient:
+    # Only ever used on the I/O loop, since pooled connections are tied to one loop
+    global _HTTP_CLIENT
+    with _io_lock:
+        if _HTTP_CLIENT is None:
+            _HTTP_CLIENT = httpx.AsyncClient(
+                http2=True,
+                timeout=30,
+                limits=httpx.Limits(max_keepalive_connections=32)
+            )
+        return _HTTP_CLIENT
+
+# Shared pool for blocking tool calls and other short blocking work started from async code.
+# Crews stay on the default executor, since they wait on this pool for their own tool calls.
+_IO_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="crew-tool")
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared I/O pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_IO_POOL, functools.partial(func, *args, **kwargs))
+
+def as_async_tool(sync_tool):
+    """Adapt a sync CrewAI tool into a coroutine function that runs it on the I/O pool."""
+    async def run(**args):
+        return await run_blocking(sync_tool.run, **args)
+    return run
+
+def run_io(coro):
+    """Run a coroutine on the shared I/O loop from sync code and wait for its result.
+    
+    Works whether or not the calling thread already has a running event loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _io_loop()).result()
+
+async def _on_io_loop(coro):
+    """Await a coroutine on the shared I/O loop from any other loop."""
+    loop = _io_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+async def _exa_search(query: str, exa_api_key: str) -> Dict[str, Any]:
+    response = await _http_client().post(
+        EXA_SEARCH_URL,
+        headers={"x-api-key": exa_api_key},
+        json={
+            "query": query,
+            "type": "neural",
+            "useAutoprompt": True,
+            "numResults": 5,
+            "contents": {"highlights": True}
+        }
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def exa_search_async(query: str) -> str:
+    """Run an Exa semantic search over HTTP and return formatted result highlights."""
+    # Cache lookups may encode the query (or first load the model), so keep them off the loop
+    cached, vector = await run_blocking(exa_search_cache.lookup, query)
+    if cached is not None:
+        return cached
     
     exa_api_key = os.environ.get("EXA_API_KEY")
     if not exa_api_key:
         raise ValueError("EXA_API_KEY environment variable not set")
-        
-    exa = Exa(exa_api_key)
     
-    response = exa.search_and_contents(
-        query,
-        type="neural",
-        use_autoprompt=True,
-        num_results=5,
-        highlights=True
-    )
+    # Every search goes through the one pooled client, so connections are reused
+    response = await _on_io_loop(_exa_search(query, exa_api_key))
     
     results = []
-    for idx, result in enumerate(response.results):
-        results.append(f"[SOURCE {idx+1}]\nTitle: {result.title}\nURL: {result.url}\n")
-        results.append(f"Highlights:\n{''.join(result.highlights)}\n\n")
+    for idx, result in enumerate(response["results"]):
+        results.append(f"[SOURCE {idx+1}]\nTitle: {result.get('title')}\nURL: {result['url']}\n")
+        results.append(f"Highlights:\n{''.join(result.get('highlights') or [])}\n\n")
+    
+    output = "\n".join(results)
+    await run_blocking(exa_search_cache.set, query, output, vector)
+    return output
+
+# Create custom Exa search tool
+@tool("Exa search and get contents")
+def exa_search_tool(query: str) -> str:
+    """Tool using Exa's search API to run semantic search and return result highlights."""
+    return run_io(exa_search_async(query))
+
+# Native async implementations, used instead of the sync tool when dispatching in parallel
+ASYNC_TOOLS = {
+    exa_search_tool.name: exa_search_async,
+}
+
+async def dispatch_tool_calls(tools: Dict[str, Any], calls: List[Dict[str, Any]]) -> List[str]:
+    """Run independent tool calls concurrently, returning results in call order."""
+    async def run_call(call: Dict[str, Any]) -> str:
+        name = call.get("tool")
+        args = call.get("args") or {}
+        if name not in tools:
+            return f"Error: Tool '{name}' not available"
+        try:
+            run_tool = ASYNC_TOOLS.get(name) or as_async_tool(tools[name])
+            return await run_tool(**args)
+        except Exception as e:
+            return f"Error: {e}"
+    
+    return await asyncio.gather(*[run_call(call) for call in calls])
+
+def make_parallel_tool(tools: List[Any]):
+    """Build a tool that lets an agent fan out several calls to its other tools in one step."""
+    tools_by_name = {t.name: t for t in tools}
+    
+    @tool("Run tools in parallel")
+    def parallel_tool(calls: List[Dict[str, Any]]) -> str:
+        """Run several independent tool calls at the same time. `calls` is a list of
+        {"tool": "<tool name>", "args": {"<argument>": "<value>"}} objects, e.g. several
+        searches at once. Results are returned in the same order as the calls."""
+        results = run_io(dispatch_tool_calls(tools_by_name, calls))
+        return "\n\n".join(
+            f"[CALL {idx+1}: {call.get('tool')}]\n{result}"
+            for idx, (call, result) in enumerate(zip(calls, results))
+        )
     
-    return "\n".join(results)
+    return parallel_tool
+
+class LLMCache:
+    """In-memory LRU cache for LLM responses with per-entry expiry."""
+    
+    def __init__(self, default_ttl: Optional[float] = 3600, max_entries: int = 256):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        # Hand out a copy so callers can't mutate the cached design
+        return copy.deepcopy(value)
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.monotonic()
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            # Drop expired entries so keys that are never read again don't pile up
+            expired = [
+                cached_key for cached_key, (_, cached_expiry) in self._entries.items()
+                if cached_expiry is not None and cached_expiry < now
+            ]
+            for cached_key in expired:
+                del self._entries[cached_key]
+            
+            self._entries[key] = (copy.deepcopy(value), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class RedisLLMCache:
+    """LLM response cache backed by a Redis client (e.g. ``redis.Redis.from_url(...)``)."""
+    
+    def __init__(self, client, prefix: str = "crew:llm:", default_ttl: Optional[int] = 3600):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+    
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return orjson.loads(raw) if raw is not None else None
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, orjson.dumps(value), ex=ttl or None)
 
 class PromptAnalyzer:
     """Analyzes the user prompt to design an optimal agent team structure."""
     
-    def __init__(self, api_key=None, model="gpt-4o"):
+    # Kept short because it is sent with every analyze call; this only trims input tokens
+    SYSTEM_MESSAGE = """You design AI agent teams. For the user's goal return ONLY JSON:
+{"agents": [{"role": str, "goal": str, "backstory": str, "tools": [str], "model": str}],
+ "tasks": [{"description": str, "expected_output": str, "agent_role": str, "depends_on": [str]}],
+ "process": "sequential" | "hierarchical"}
+Rules:
+- 2-5 agents; tools from ExaSearchTool (semantic web search), WebsiteSearchTool (website content), FileReadTool (read files).
+- model is "gpt-4o-mini"; use "gpt-4o" only for agents needing deep reasoning.
+- depends_on lists only roles whose output the task needs; tasks with [] run in parallel.
+- No {placeholders} in descriptions; write plain instructions like "Use search tools to gather information".
+"""
+    
+    def __init__(self, api_key=None, model="gpt-4o-mini", temperature=0, cache=None):
+        self.model = model
+        self.temperature = temperature
         self.llm = ChatOpenAI(
             openai_api_key=api_key or os.environ.get("OPENAI_API_KEY"),
             model=model,
-            temperature=0
+            temperature=temperature
         )
+        # Any object with get(key) / set(key, value, ttl=...) works as a backend
+        self.cache = cache if cache is not None else LLMCache()
     
-    def analyze(self, prompt: str) -> Dict[str, Any]:
-        system_message = """
-        You are an AI team architect who designs optimal agent teams for complex tasks.
-        For a given user goal, determine:
-        1. The necessary specialized agents (2-5 agents)
-        2. Each agent's role, goal, backstory and required tools
-        3. The specific tasks each agent should perform
-        4. The execution process (sequential or hierarchical)
-        
-        Available tools: ExaSearchTool (advanced semantic web search), WebsiteSearchTool (website content extraction), 
-        FileReadTool (file reading)
-        
-        IMPORTANT: Do NOT include placeholder variables like {tool_name} in task descriptions.
-        Instead write plain text instructions like "Use search tools to gather information".
-        
-        Return ONLY valid JSON with this structure:
-        {
-            "agents": [
-                {
-                    "role": "Role name",
-                    "goal": "Agent's goal",
-                    "backstory": "Brief backstory",
-                    "tools": ["ExaSearchTool", "WebsiteSearchTool", "FileReadTool"]
-                }
-            ],
-            "tasks": [
-                {
-                    "description": "Task description in plain text without placeholders",
-                    "expected_output": "Expected output description",
-                    "agent_role": "Which agent performs this"
-                }
-            ],
-            "process": "sequential" or "hierarchical"
-        }
-        """
-        
-        messages = [
-            {"role": "system", "content": system_message},
+    def _cache_key(self, system_message: str, prompt: str) -> Optional[str]:
+        # Only deterministic (temperature 0) responses are safe to reuse
+        if self.temperature != 0:
+            return None
+        payload = orjson.dumps(
+            {"model": self.model, "sys": system_message, "prompt": prompt},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return hashlib.sha256(payload).hexdigest()
+    
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self.SYSTEM_MESSAGE},
             {"role": "user", "content": f"Design an optimal AI agent team for this goal: {prompt}"}
         ]
-        
-        response = self.llm.invoke(messages)
-        content = response.content
-        
+    
+    def _parse_response(self, content: str, blob_re=_JSON_BLOB_RE) -> Optional[Any]:
+        """Extract the team design JSON from an LLM response, or None if it can't be parsed."""
         # Clean up common formatting issues
         content = content.strip()
         
@@ -98,73 +353,238 @@ class PromptAnalyzer:
             content = content.replace("```", "")
         
         # Try to extract JSON using regex if we still have issues
-        json_match = re.search(r'({[\s\S]*})', content)
+        json_match = blob_re.search(content)
         if json_match:
-            content = json_match.group(1)
+            content = json_match.group(0)
             
         try:
-            return json.loads(content)
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
-            print(f"Content: {content}")
-            # Fall back to a minimal valid structure
-            return {
-                "agents": [
-                    {
-                        "role": "Researcher",
-                        "goal": "Research information related to the task",
-                        "backstory": "Expert researcher with analytical skills",
-                        "tools": ["ExaSearchTool"]
-                    },
-                    {
-                        "role": "Writer",
-                        "goal": "Create content based on research findings",
-                        "backstory": "Expert writer skilled at creating engaging content",
-                        "tools": []
-                    }
-                ],
-                "tasks": [
-                    {
-                        "description": f"Research information about: {prompt}",
-                        "expected_output": "Comprehensive research findings",
-                        "agent_role": "Researcher"
-                    },
-                    {
-                        "description": f"Create content about: {prompt} based on the research",
-                        "expected_output": "Engaging and informative content",
-                        "agent_role": "Writer"
-                    }
-                ],
-                "process": "sequential"
-            }
+            return orjson.loads(content)
+        except orjson.JSONDecodeError as e:
+            log.error("Error parsing JSON: %s", e)
+            log.debug("Content: %s", content)
+            return None
+    
+    def _fallback_design(self, prompt: str) -> Dict[str, Any]:
+        """A minimal valid structure for when the LLM response can't be parsed."""
+        return {
+            "agents": [
+                {
+                    "role": "Researcher",
+                    "goal": "Research information related to the task",
+                    "backstory": "Expert researcher with analytical skills",
+                    "tools": ["ExaSearchTool"]
+                },
+                {
+                    "role": "Writer",
+                    "goal": "Create content based on research findings",
+                    "backstory": "Expert writer skilled at creating engaging content",
+                    "tools": []
+                }
+            ],
+            "tasks": [
+                {
+                    "description": f"Research information about: {prompt}",
+                    "expected_output": "Comprehensive research findings",
+                    "agent_role": "Researcher",
+                    "depends_on": []
+                },
+                {
+                    "description": f"Create content about: {prompt} based on the research",
+                    "expected_output": "Engaging and informative content",
+                    "agent_role": "Writer",
+                    "depends_on": ["Researcher"]
+                }
+            ],
+            "process": "sequential"
+        }
+    
+    def analyze(self, prompt: str) -> Dict[str, Any]:
+        cache_key = self._cache_key(self.SYSTEM_MESSAGE, prompt)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = self.llm.invoke(self._build_messages(prompt))
+        team_design = self._parse_response(response.content)
+        if team_design is None:
+            return self._fallback_design(prompt)
+        
+        if cache_key:
+            self.cache.set(cache_key, team_design)
+        return team_design
+    
+    @staticmethod
+    def _complete_agents(buffer: str) -> Optional[List[Dict]]:
+        """Return the "agents" list from a partial response once it has fully arrived."""
+        match = _AGENTS_KEY_RE.search(buffer)
+        if not match:
+            return None
+        try:
+            agents, _ = _JSON_DECODER.raw_decode(buffer, match.end())
+        except json.JSONDecodeError:
+            return None
+        return agents if isinstance(agents, list) else None
+    
+    async def analyze_stream(self, prompt: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream the team design as the LLM writes it.
+        
+        Yields ("agents", agent_specs) as soon as the agents list is complete, so agents can be
+        built while the tasks are still being generated, then ("design", team_design).
+        """
+        cache_key = self._cache_key(self.SYSTEM_MESSAGE, prompt)
+        cached = self.cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            yield "agents", cached["agents"]
+            yield "design", cached
+            return
+        
+        content = ""
+        agents = None
+        async for chunk in self.llm.astream(self._build_messages(prompt)):
+            content += chunk.content
+            # The agents list can only have closed in a chunk containing "]"
+            if agents is None and "]" in chunk.content:
+                agents = self._complete_agents(content)
+                if agents is not None:
+                    yield "agents", agents
+        
+        team_design = self._parse_response(content)
+        if team_design is None:
+            team_design = self._fallback_design(prompt)
+        elif cache_key:
+            self.cache.set(cache_key, team_design)
+        yield "design", team_design
+    
+    def analyze_batch(self, prompts: List[str]) -> List[Dict[str, Any]]:
+        """Design teams for several prompts with a single LLM call."""
+        designs = {}
+        misses = []
+        for prompt in prompts:
+            cache_key = self._cache_key(self.SYSTEM_MESSAGE, prompt)
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                designs[prompt] = cached
+            elif prompt not in misses:
+                misses.append(prompt)
+        
+        if len(misses) == 1:
+            designs[misses[0]] = self.analyze(misses[0])
+        elif misses:
+            goals = "\n".join(f"{idx+1}. {prompt}" for idx, prompt in enumerate(misses))
+            messages = [
+                {"role": "system", "content": self.SYSTEM_MESSAGE + (
+                    f"\nYou will be given {len(misses)} numbered goals. Design one team per goal and "
+                    f"return ONLY a JSON array of {len(misses)} such objects, in the same order as the goals."
+                )},
+                {"role": "user", "content": f"Design an optimal AI agent team for each of these goals:\n{goals}"}
+            ]
+            response = self.llm.invoke(messages)
+            batch = self._parse_response(response.content, _JSON_ARRAY_RE)
+            
+            if isinstance(batch, list) and len(batch) == len(misses) and all(isinstance(d, dict) for d in batch):
+                for prompt, team_design in zip(misses, batch):
+                    cache_key = self._cache_key(self.SYSTEM_MESSAGE, prompt)
+                    if cache_key:
+                        self.cache.set(cache_key, team_design)
+                    designs[prompt] = team_design
+            else:
+                log.warning("Batched team design was incomplete, analyzing prompts one by one")
+                for prompt in misses:
+                    designs[prompt] = self.analyze(prompt)
+        
+        return [copy.deepcopy(designs[prompt]) for prompt in prompts]
+    
+    async def analyze_k(self, prompt: str, k: int = 3, temperature: float = 0.7) -> List[Dict[str, Any]]:
+        """Sample up to k distinct team designs for the same prompt concurrently.
+        
+        Failed samples are dropped; an error is only raised if every sample failed.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        
+        llm = self.llm.bind(temperature=temperature)
+        messages = self._build_messages(prompt)
+        responses = await asyncio.gather(
+            *[llm.ainvoke(messages) for _ in range(k)], return_exceptions=True
+        )
+        
+        errors = [response for response in responses if isinstance(response, Exception)]
+        for error in errors:
+            log.warning("Team design sample failed: %s", error)
+        if len(errors) == len(responses):
+            raise errors[0]
+        
+        designs = []
+        seen = set()
+        for response in responses:
+            if isinstance(response, Exception):
+                continue
+            team_design = self._parse_response(response.content) or self._fallback_design(prompt)
+            fingerprint = orjson.dumps(team_design, option=orjson.OPT_SORT_KEYS)
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                designs.append(team_design)
+        
+        return designs
 
 class AgentFactory:
-    """Creates appropriate CrewAI agents based on specifications."""
+    """Creates appropriate CrewAI agents based on specifications.
+    
+    Every call builds fresh Agent objects, since CrewAI mutates an agent while it runs a crew.
+    LLM clients and stateless tools are shared across calls. WebsiteSearchTool keeps a RAG
+    index of every site it visits, so each call (i.e. each crew) gets its own instance,
+    shared only by that crew's agents.
+    """
+    
+    # Models a team design may assign to an agent
+    ALLOWED_MODELS = {"gpt-4o-mini", "gpt-4o"}
     
-    def __init__(self):
-        # Simplified tools map with only the tools we have
+    def __init__(self, default_model="gpt-4o-mini"):
+        self.default_model = default_model
+        # Tool factories, so heavier tools are only built when an agent needs them;
+        # stateless tools are cached, stateful ones are built fresh for each crew
         self.tools_map = {
-            "ExaSearchTool": exa_search_tool,
-            "WebsiteSearchTool": WebsiteSearchTool(),
-            "FileReadTool": FileReadTool(),
+            "ExaSearchTool": lambda: exa_search_tool,
+            "WebsiteSearchTool": lambda: WebsiteSearchTool(),
+            "FileReadTool": functools.cache(lambda: FileReadTool()),
         }
+        self._llm = functools.cache(lambda model: LLM(model=model))
     
     def create_agents(self, agent_specs: List[Dict]) -> Dict[str, Agent]:
         agents = {}
+        # Tools built for this crew, shared between its agents
+        crew_tools = {}
+        parallel_tools = {}
         for spec in agent_specs:
             # Extract specs
             role = spec["role"]
             goal = spec["goal"]
             backstory = spec["backstory"]
+            model = spec.get("model") or self.default_model
+            if model not in self.ALLOWED_MODELS and model != self.default_model:
+                log.warning("Model '%s' not allowed for agent '%s', using '%s'",
+                            model, role, self.default_model)
+                model = self.default_model
             
             # Get relevant tools
             tools = []
             if "tools" in spec:
                 for tool_name in spec["tools"]:
                     if tool_name in self.tools_map:
-                        tools.append(self.tools_map[tool_name])
+                        if tool_name not in crew_tools:
+                            crew_tools[tool_name] = self.tools_map[tool_name]()
+                        tools.append(crew_tools[tool_name])
                     else:
-                        print(f"Warning: Tool '{tool_name}' not found, skipping")
+                        log.warning("Tool '%s' not found, skipping", tool_name)
+            
+            # Let the agent batch independent calls to its tools into a single step
+            if tools:
+                # Tools are pydantic models (unhashable), but within a crew each name maps to one instance
+                key = tuple(t.name for t in tools)
+                if key not in parallel_tools:
+                    parallel_tools[key] = make_parallel_tool(tools)
+                tools.append(parallel_tools[key])
             
             # Create agent
             agent = Agent(
@@ -172,7 +592,8 @@ class AgentFactory:
                 goal=goal,
                 backstory=backstory,
                 tools=tools,
-                verbose=True
+                llm=self._llm(model),
+                verbose=os.environ.get("CREW_VERBOSE") == "1"
             )
             
             agents[role] = agent
@@ -182,7 +603,47 @@ class AgentFactory:
 class TaskFactory:
     """Creates appropriate CrewAI tasks based on specifications."""
     
-    def create_tasks(self, task_specs: List[Dict], agents: Dict[str, Agent]) -> List[Task]:
+    def resolve_dependencies(self, task_specs: List[Dict]) -> List[set]:
+        """Map each task to the indices of the tasks whose output it needs."""
+        role_tasks = {}
+        for idx, spec in enumerate(task_specs):
+            role_tasks.setdefault(spec["agent_role"], []).append(idx)
+        
+        dependencies = []
+        for idx, spec in enumerate(task_specs):
+            if "depends_on" not in spec:
+                # No explicit dependencies keeps the old sequential behaviour
+                dependencies.append(set(range(idx)))
+                continue
+            
+            needed = set()
+            for role in spec["depends_on"] or []:
+                for other in role_tasks.get(role, []):
+                    # Only earlier tasks of the agent's own role, so it can't wait on itself
+                    if role != spec["agent_role"] or other < idx:
+                        needed.add(other)
+            dependencies.append(needed)
+        
+        return dependencies
+    
+    def plan_waves(self, dependencies: List[set]) -> List[List[int]]:
+        """Group task indices into waves whose tasks don't depend on each other."""
+        waves = []
+        done = set()
+        while len(done) < len(dependencies):
+            wave = [
+                idx for idx, needed in enumerate(dependencies)
+                if idx not in done and needed <= done
+            ]
+            if not wave:
+                raise ValueError("Task dependencies contain a cycle")
+            waves.append(wave)
+            done.update(wave)
+        
+        return waves
+    
+    def create_tasks(self, task_specs: List[Dict], agents: Dict[str, Agent],
+                     dependencies: Optional[List[set]] = None) -> List[Task]:
         tasks = []
         
         for spec in task_specs:
@@ -194,7 +655,7 @@ class TaskFactory:
             # Clean the description to remove any template variables
             description = spec["description"]
             # Remove any {variable} placeholders that might cause template errors
-            cleaned_description = re.sub(r'{[^}]*}', '', description)
+            cleaned_description = _PLACEHOLDER_RE.sub('', description)
             
             # Create task
             task = Task(
@@ -205,6 +666,12 @@ class TaskFactory:
             
             tasks.append(task)
         
+        # Pass the output of prerequisite tasks along as context
+        if dependencies:
+            for task, needed in zip(tasks, dependencies):
+                if needed:
+                    task.context = [tasks[idx] for idx in sorted(needed)]
+        
         return tasks
 
 class CrewFactory:
@@ -221,7 +688,7 @@ class CrewFactory:
             agents=list(agents.values()),
             tasks=tasks,
             process=process,
-            verbose=True
+            verbose=os.environ.get("CREW_VERBOSE") == "1"
         )
 
 class DynamicCrewSystem:
@@ -232,25 +699,198 @@ class DynamicCrewSystem:
         self.agent_factory = AgentFactory()
         self.task_factory = TaskFactory()
         self.crew_factory = CrewFactory()
+        # Keep references to background prefetches so they aren't garbage collected mid-flight
+        self._prefetches = set()
+    
+    def _prefetch_searches(self, team_design: Dict[str, Any]):
+        """Start Exa searches for the searching agents' tasks so results are cached before they ask."""
+        if not os.environ.get("EXA_API_KEY"):
+            return
+        
+        searching_roles = {
+            spec["role"] for spec in team_design["agents"]
+            if "ExaSearchTool" in spec.get("tools", [])
+        }
+        for spec in team_design["tasks"]:
+            if spec["agent_role"] in searching_roles:
+                prefetch = asyncio.ensure_future(exa_search_async(spec["description"]))
+                self._prefetches.add(prefetch)
+                prefetch.add_done_callback(self._prefetch_done)
+    
+    def _prefetch_done(self, prefetch: asyncio.Future):
+        self._prefetches.discard(prefetch)
+        # A failed prefetch just means the agent's own search goes to the network
+        if not prefetch.cancelled() and prefetch.exception() is not None:
+            log.warning("Search prefetch failed: %s", prefetch.exception())
     
-    def execute(self, prompt: str, inputs: Dict[str, Any] = None) -> Any:
+    async def execute(self, prompt: str, inputs: Dict[str, Any] = None) -> Any:
         """Process user prompt and execute the dynamically created crew."""
-        # Get team design from prompt
-        team_design = self.prompt_analyzer.analyze(prompt)
-        print(f"Generated team design: {json.dumps(team_design, indent=2)}")
+        # Get team design from prompt, building agents while the tasks are still streaming
+        agents_build = None
+        try:
+            async for stage, value in self.prompt_analyzer.analyze_stream(prompt):
+                if stage == "agents":
+                    agents_build = (value, asyncio.ensure_future(
+                        run_blocking(self.agent_factory.create_agents, value)
+                    ))
+                else:
+                    team_design = value
+        except BaseException:
+            # Nobody will await the build if the stream fails, so don't leave it dangling
+            if agents_build is not None:
+                agents_build[1].cancel()
+            raise
+        log.debug("Generated team design: %s", team_design)
         
-        # Create agents
-        agents = self.agent_factory.create_agents(team_design["agents"])
+        agents = None
+        if agents_build is not None:
+            agent_specs, build = agents_build
+            built_agents = await build
+            # A fallback design won't match what was streamed
+            if agent_specs == team_design["agents"]:
+                agents = built_agents
         
-        # Create tasks
-        tasks = self.task_factory.create_tasks(team_design["tasks"], agents)
+        return await self._run_design(team_design, inputs, agents)
+    
+    async def execute_batch(self, prompts: List[str],
+                            inputs: Optional[List[Dict[str, Any]]] = None) -> List[Any]:
+        """Design all teams with one analyzer call, then run every crew concurrently.
         
-        # Create crew
-        crew = self.crew_factory.create_crew(
-            agents, tasks, team_design.get("process", "sequential")
+        Results are returned in prompt order; a prompt whose crew failed yields its exception.
+        """
+        if inputs is not None and len(inputs) != len(prompts):
+            raise ValueError(f"Got {len(inputs)} inputs for {len(prompts)} prompts")
+        
+        team_designs = await run_blocking(self.prompt_analyzer.analyze_batch, prompts)
+        for prompt, team_design in zip(prompts, team_designs):
+            log.debug("Generated team design for '%s': %s", prompt, team_design)
+        
+        inputs = inputs or [{} for _ in prompts]
+        return await asyncio.gather(
+            *[self._run_design(team_design, prompt_inputs)
+              for team_design, prompt_inputs in zip(team_designs, inputs)],
+            return_exceptions=True
+        )
+    
+    async def execute_speculative(self, prompt: str, inputs: Dict[str, Any] = None,
+                                  k: int = 3, aggregate: bool = False) -> Any:
+        """Run several sampled team designs at once and keep the first (or a merged) result."""
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        
+        designs = await self.prompt_analyzer.analyze_k(prompt, k)
+        runs = [asyncio.create_task(self._run_design(design, inputs)) for design in designs]
+        
+        if aggregate:
+            results = await asyncio.gather(*runs, return_exceptions=True)
+            candidates = [str(result) for result in results if not isinstance(result, Exception)]
+            if not candidates:
+                raise results[0]
+            return await self._aggregate(prompt, candidates)
+        
+        pending = set(runs)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for run in done:
+                if run.exception() is None:
+                    # Crews run in worker threads, so cancelling only stops waiting on them
+                    for loser in pending:
+                        loser.cancel()
+                    return run.result()
+                error = run.exception()
+        
+        raise error
+    
+    async def _aggregate(self, prompt: str, candidates: List[str]) -> Any:
+        """Merge candidate results from several teams into one answer."""
+        agents = await run_blocking(self.agent_factory.create_agents, [{
+            "role": "Aggregator",
+            "goal": "Combine candidate answers into the single best response",
+            "backstory": "Meticulous editor who reconciles the work of several teams",
+            "tools": []
+        }])
+        numbered = "\n\n".join(
+            f"[CANDIDATE {idx+1}]\n{candidate}" for idx, candidate in enumerate(candidates)
         )
+        # Built directly rather than via TaskFactory, whose placeholder stripping would mangle
+        # code or JSON in the candidates; kicking off without inputs means no interpolation
+        task = Task(
+            description=f"Goal: {prompt}\n\nMerge the best parts of these candidate answers "
+                        f"into one complete response:\n\n{numbered}",
+            expected_output="A single response that best accomplishes the goal",
+            agent=agents["Aggregator"]
+        )
+        crew = self.crew_factory.create_crew(agents, [task], "sequential")
+        return await crew.kickoff_async()
+    
+    async def _run_design(self, team_design: Dict[str, Any], inputs: Dict[str, Any] = None,
+                          agents: Optional[Dict[str, Agent]] = None) -> Any:
+        """Build and execute the crew described by a team design."""
+        # Warm the search cache while the crew is being put together
+        self._prefetch_searches(team_design)
+        await asyncio.sleep(0)
+        
+        # Create agents unless they were already built from the streamed design
+        if agents is None:
+            agents = await run_blocking(self.agent_factory.create_agents, team_design["agents"])
+        
+        # Work out which tasks can run side by side
+        task_specs = team_design["tasks"]
+        dependencies = self.task_factory.resolve_dependencies(task_specs)
+        try:
+            waves = self.task_factory.plan_waves(dependencies)
+        except ValueError as e:
+            log.warning("%s, running tasks sequentially", e)
+            dependencies = [set(range(idx)) for idx in range(len(task_specs))]
+            waves = [[idx] for idx in range(len(task_specs))]
+        
+        # Create tasks
+        tasks = self.task_factory.create_tasks(task_specs, agents, dependencies)
+        
+        process_type = team_design.get("process", "sequential")
+        if process_type.lower() == "hierarchical":
+            # The manager agent does its own scheduling, so keep a single crew
+            crew = self.crew_factory.create_crew(agents, tasks, process_type)
+            return await crew.kickoff_async(inputs=inputs or {})
         
         # Execute crew with any additional inputs
-        result = crew.kickoff(inputs=inputs or {})
+        return await self._run_waves(agents, tasks, task_specs, waves, inputs or {})
+    
+    async def _run_waves(self, agents: Dict[str, Agent], tasks: List[Task], task_specs: List[Dict],
+                         waves: List[List[int]], inputs: Dict[str, Any]) -> Any:
+        """Run each wave of independent tasks concurrently, one wave after another.
         
-        return result
+        Returns a single CrewOutput covering every sub-crew, like a sequential crew would.
+        """
+        crew_outputs = []
+        for wave in waves:
+            # One sub-crew per agent so an agent never works on two tasks at once
+            role_tasks = {}
+            for idx in wave:
+                role_tasks.setdefault(task_specs[idx]["agent_role"], []).append(idx)
+            
+            wave_crews = [
+                self.crew_factory.create_crew(
+                    {role: agents[role]}, [tasks[idx] for idx in indices], "sequential"
+                )
+                for role, indices in role_tasks.items()
+            ]
+            crew_outputs.extend(await asyncio.gather(
+                *[crew.kickoff_async(inputs=inputs) for crew in wave_crews]
+            ))
+        
+        # Nothing depends on a task in the final wave; of those, report the last one listed
+        final_output = tasks[max(waves[-1])].output
+        
+        token_usage = UsageMetrics()
+        for output in crew_outputs:
+            token_usage.add_usage_metrics(output.token_usage)
+        
+        return CrewOutput(
+            raw=final_output.raw,
+            pydantic=final_output.pydantic,
+            json_dict=final_output.json_dict,
+            tasks_output=[task.output for task in tasks],
+            token_usage=token_usage
+        )
@@ -1,8 +1,16 @@
 # test.py
 from dynamic_crew import DynamicCrewSystem
+import asyncio
 import os
 import traceback
 
+# uvloop speeds up the event loop but isn't available on Windows
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    pass
+
 # Check for API keys
 if not os.environ.get("OPENAI_API_KEY"):
     print("Warning: OPENAI_API_KEY environment variable not set")
@@ -13,32 +21,65 @@ if not os.environ.get("EXA_API_KEY"):
 # Initialize system
 system = DynamicCrewSystem()
 
-def test_prompt(prompt, inputs=None):
-    print(f"\n\n{'='*80}")
-    print(f"TESTING PROMPT: {prompt}")
-    print(f"INPUTS: {inputs or {}}")
-    print(f"{'='*80}\n")
-    
+test_prompts = [
+    {
+        "prompt": "Create a beginner's guide to artificial intelligence with examples and analogies.",
+        "inputs": {}
+    },
+    {
+        "prompt": "Research the impact of artificial intelligence on healthcare",
+        "inputs": {}
+    },
+    {
+        "prompt": "Develop a marketing strategy for a new product launch",
+        "inputs": {
+            "product_name": "EcoWash",
+            "target_audience": "Environmentally conscious homeowners"
+        }
+    },
+]
+
+async def test_prompt(prompt, inputs=None):
     try:
         # Execute the system with the prompt
-        result = system.execute(prompt, inputs or {})
+        result = await system.execute(prompt, inputs or {})
         
         # Print the result
+        print(f"\n\n{'='*80}")
+        print(f"TESTING PROMPT: {prompt}")
+        print(f"INPUTS: {inputs or {}}")
+        print(f"{'='*80}\n")
         print("\nRESULT:")
         print(result)
         return True
         
     except Exception as e:
-        print(f"ERROR: {str(e)}")
+        print(f"ERROR in '{prompt}': {str(e)}")
         print(traceback.format_exc())
         return False
 
-# Test with a simple prompt
-success = test_prompt(
-    "Create a beginner's guide to artificial intelligence with examples and analogies."
-)
+async def run_all_tests():
+    # Bound concurrency so the batch doesn't trip API rate limits
+    sem = asyncio.Semaphore(int(os.environ.get("CREW_CONCURRENCY", "5")))
+    
+    # Design every team in one analyzer call; execute() then picks the designs up from the cache
+    try:
+        await asyncio.to_thread(
+            system.prompt_analyzer.analyze_batch, [test["prompt"] for test in test_prompts]
+        )
+    except Exception as e:
+        # Only a warm-up: each test still designs its own team and reports its own errors
+        print(f"Warning: Batched team design failed, designing teams per test: {str(e)}")
+    
+    async def bounded(test):
+        async with sem:
+            return await test_prompt(test["prompt"], test["inputs"])
+    
+    return await asyncio.gather(*[bounded(test) for test in test_prompts])
+
+results = asyncio.run(run_all_tests())
 
-if success:
-    print("\n✅ Test completed successfully!")
+if all(results):
+    print(f"\n✅ All {len(results)} tests completed successfully!")
 else:
-    print("\n❌ Test failed.")
+    print(f"\n❌ {results.count(False)} of {len(results)} tests failed.")